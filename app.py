@@ -1,175 +1,30 @@
 import streamlit as st
-import requests
-import xml.etree.ElementTree as ET
-from urllib.parse import urlparse, urljoin
+from urllib.parse import urlsplit
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import io
 import time
-from bs4 import BeautifulSoup
-
-# --- Helper Functions ---
-HEADERS = {
-    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-}
-
-def normalize_domain(domain):
-    """
-    Normalizes a domain by removing 'www.' and converting to lowercase.
-    """
-    if not domain:
-        return ""
-    return domain.lower().replace('www.', '')
-
-def get_sitemap_url(base_url):
-    """
-    Attempts to find the sitemap URL by checking robots.txt or common paths.
-    """
-    parsed_url = urlparse(base_url)
-    domain = f"{parsed_url.scheme}://{parsed_url.netloc}"
-    
-    # Check robots.txt
-    robots_url = urljoin(domain, '/robots.txt')
-    try:
-        response = requests.get(robots_url, headers=HEADERS, timeout=10)
-        if response.status_code == 200:
-            for line in response.text.splitlines():
-                if line.lower().startswith('sitemap:'):
-                    return line.split(':', 1)[1].strip()
-    except requests.RequestException:
-        pass
-    
-    # Fallback to standard sitemap locations
-    common_paths = ['/sitemap.xml', '/sitemap_index.xml', '/wp-sitemap.xml']
-    for path in common_paths:
-        try:
-            sitemap_candidate = urljoin(domain, path)
-            # Use HEAD request to check availability without downloading full content
-            response = requests.head(sitemap_candidate, headers=HEADERS, timeout=10)
-            if response.status_code == 200:
-                return sitemap_candidate
-        except requests.RequestException:
-            continue
-            
-    return None
-
-def extract_links_from_sitemap(sitemap_url):
-    """
-    Fetches and parses the sitemap XML to extract URLs.
-    """
-    links = []
-    try:
-        response = requests.get(sitemap_url, headers=HEADERS, timeout=15)
-        if response.status_code != 200:
-            return []
-
-        root = ET.fromstring(response.content)
-        namespace = {'ns': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
-        
-        if root.tag.endswith('sitemapindex'):
-             for sitemap in root.findall('ns:sitemap', namespace):
-                 loc = sitemap.find('ns:loc', namespace)
-                 if loc is not None:
-                     links.extend(extract_links_from_sitemap(loc.text))
-        else:
-             for url in root.findall('ns:url', namespace):
-                 loc = url.find('ns:loc', namespace)
-                 if loc is not None:
-                     links.append(loc.text)
-                     
-    except (requests.RequestException, ET.ParseError):
-        return []
-        
-    return links
-
-def count_internal_links(page_url, target_domains):
-    """
-    Fetches a page and counts unique internal links to any of the target domains,
-    heuristically excluding navigation, footer, and sidebars.
-    target_domains: A set of normalized domain strings.
-    Returns: A dictionary with 'Total' and individual domain counts.
-    """
-    results = {d: 0 for d in target_domains}
-    results['Total'] = 0
-    
-    try:
-        response = requests.get(page_url, headers=HEADERS, timeout=10)
-        if response.status_code != 200:
-            return results
-            
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Heuristic: Find main content to avoid counting nav/footer links
-        content_area = None
-        
-        # Priority 1: <article> tag
-        article = soup.find('article')
-        if article:
-            content_area = article
-        
-        # Priority 2: <main> tag
-        if not content_area:
-            main = soup.find('main')
-            if main:
-                content_area = main
-                
-        # Priority 3: Fallback to body
-        if not content_area:
-            content_area = soup.find('body')
-            
-        if not content_area:
-             return results
-
-        # Create a copy or work directly? Modifying soup modifies the tree.
-        # We can just decompose the unwanted tags within the content_area
-        exclude_tags = ['nav', 'header', 'footer', 'aside', 'form', 'script', 'style']
-        for tag in content_area.find_all(exclude_tags):
-            tag.decompose()
-            
-        links = content_area.find_all('a', href=True)
-        
-        # Track unique links per domain to avoid double counting same link
-        found_links = set() 
-        
-        for link in links:
-            href = link['href']
-            # handle relative URLs
-            full_url = urljoin(page_url, href)
-            parsed_href = urlparse(full_url)
-            
-            # Normalize the link's domain
-            link_domain = normalize_domain(parsed_href.netloc)
-            
-            # Check if link belongs to any of the target domains
-            # If netloc is empty (relative link), it's internal to the page_url's domain
-            if not parsed_href.netloc:
-                # Need to figure out which base domain this relative link belongs to.
-                # Since we are crawling page_url, it belongs to page_url's domain.
-                page_domain = normalize_domain(urlparse(page_url).netloc)
-                link_domain = page_domain
-            
-            if link_domain in target_domains:
-                 # Exclude anchor links to the same page
-                 if full_url.split('#')[0] != page_url.split('#')[0]:
-                     if full_url not in found_links:
-                        found_links.add(full_url)
-                        results[link_domain] += 1
-                        results['Total'] += 1
-                
-        return results
-    except Exception:
-        return results
+import concurrent.futures
 
-def extract_category(url):
-    """
-    Extracts the first directory from the URL path to use as a category.
-    Example: example.com/blog/post-1 -> 'blog'
-    """
-    path = urlparse(url).path.strip('/')
-    if not path:
-        return "root"
-    
-    segments = path.split('/')
-    return segments[0] if segments else "root"
+from sitemap_core import (
+    POOL_SIZE,
+    SitemapError,
+    count_page_links,
+    ensure_scheme,
+    extract_categories,
+    extract_links_from_sitemap,
+    fetch_page_hrefs,
+    get_session,
+    get_sitemap_urls,
+    load_page_hrefs,
+    normalize_domain,
+    store_page_hrefs,
+)
+
+# Minimum seconds between progress bar redraws during analysis
+PROGRESS_INTERVAL = 0.05
 
 
 # --- Streamlit UI ---
@@ -194,18 +49,23 @@ if st.button("1. Find Sitemap & Extract Links", type="primary"):
     if not url_input:
         st.error("Please enter a URL.")
     else:
-        if not url_input.startswith(('http://', 'https://')):
-            url_input = 'https://' + url_input
+        url_input = ensure_scheme(url_input)
             
         with st.status("Finding Sitemap...", expanded=True) as status:
             st.write("🔍 Looking for sitemap...")
-            sitemap_url = get_sitemap_url(url_input)
+            try:
+                sitemap_urls = get_sitemap_urls(url_input)
+            except SitemapError:
+                sitemap_urls = []
             
-            if sitemap_url:
-                st.write(f"✅ Found sitemap: `{sitemap_url}`")
+            if sitemap_urls:
+                st.write("✅ Found sitemap: " + ", ".join(f"`{u}`" for u in sitemap_urls))
                 st.write("⏳ Extracting links...")
                 
-                links = extract_links_from_sitemap(sitemap_url)
+                try:
+                    links = extract_links_from_sitemap(sitemap_urls)
+                except SitemapError:
+                    links = []
                 
                 if links:
                     st.session_state.sitemap_links = links
@@ -219,10 +79,6 @@ if st.button("1. Find Sitemap & Extract Links", type="primary"):
                 status.update(label="Failed", state="error")
                 st.error("❌ Could not find a sitemap.")
 
-import concurrent.futures
-
-# ... imports ...
-
 # Step 2: Analysis
 if st.session_state.sitemap_links:
     st.divider()
@@ -230,64 +86,92 @@ if st.session_state.sitemap_links:
     st.markdown(f"Ready to analyze **{len(st.session_state.sitemap_links)}** pages. This will count internal links on each page.")
     
     # Speed control
-    max_workers = st.slider("Concurrency (Workers)", min_value=1, max_value=20, value=4, help="Higher values are faster but might get blocked by some servers.")
+    max_workers = st.slider("Concurrency (Workers)", min_value=1, max_value=POOL_SIZE, value=8, help="Higher values are faster but might get blocked by some servers.")
     
     if st.button("2. Analyze Internal Links"):
         progress_bar = st.progress(0)
         status_text = st.empty()
         
-        results = []
-        total_links = len(st.session_state.sitemap_links)
-        
         # Prepare Target Domains
-        main_domain = normalize_domain(urlparse(url_input if url_input.startswith('http') else 'https://' + url_input).netloc)
+        main_domain = normalize_domain(urlsplit(ensure_scheme(url_input)).netloc)
         target_domains = {main_domain}
         
         if related_domains_input:
             others = [normalize_domain(d.strip()) for d in related_domains_input.split(',')]
             target_domains.update(others)
+        target_domains = frozenset(target_domains)
             
         st.info(f"Counting links to: {', '.join(target_domains)}")
 
+        # Pages fetched recently, for any target domains, are read from the page cache
+        urls = st.session_state.sitemap_links
+        page_hrefs = load_page_hrefs(urls)
+        pending_urls = [url for url in urls if url not in page_hrefs]
+        total_links = len(pending_urls)
+
         start_time = time.time()
+        session = get_session()
+        fetched = {}
         
         # Parallel Execution
         with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # Submit all tasks. Pass the set of target_domains
-            future_to_url = {executor.submit(count_internal_links, url, target_domains): url for url in st.session_state.sitemap_links}
+            # Submit all tasks
+            future_to_url = {executor.submit(fetch_page_hrefs, url, session): url for url in pending_urls}
             
             completed_count = 0
+            failed_count = 0
+            last_update = 0.0
             for future in concurrent.futures.as_completed(future_to_url):
                 url = future_to_url[future]
-                row = {"URL": url}
                 try:
-                    # internal_count dict: {'Total': X, 'domain1': Y, ...}
-                    counts = future.result()
-                    row.update(counts)
-                except Exception as e:
-                    row['Total'] = 0 # Fail safe
+                    # The page's content hrefs, None if the page failed
+                    hrefs = future.result()
+                except Exception:
+                    hrefs = None
                 
-                results.append(row)
+                # Only successes are cached, so failed pages are retried on the next run
+                if hrefs is not None:
+                    fetched[url] = hrefs
+                else:
+                    failed_count += 1
                 
-                # Update progress
+                # Update progress, throttled so the UI isn't redrawn for every page
                 completed_count += 1
-                progress = completed_count / total_links
-                progress_bar.progress(progress)
-                status_text.text(f"Analyzing {completed_count}/{total_links}...")
-
+                if time.monotonic() - last_update > PROGRESS_INTERVAL or completed_count == total_links:
+                    progress_bar.progress(completed_count / total_links)
+                    status_text.text(f"Analyzing {completed_count}/{total_links}...")
+                    last_update = time.monotonic()
+
+        if fetched:
+            store_page_hrefs(fetched)
+            page_hrefs.update(fetched)
+
+        # Fill a preallocated int32 block instead of inferring dtypes from per-row dicts
+        count_columns = ['Total'] + sorted(target_domains)
+        column_index = {c: j for j, c in enumerate(count_columns)}
+        counts_out = np.zeros((len(urls), len(count_columns)), dtype=np.int32)
+        for i, url in enumerate(urls):
+            # Failed pages have no hrefs and keep their row of zeros
+            if url in page_hrefs:
+                for c, n in count_page_links(page_hrefs[url], url, target_domains).items():
+                    counts_out[i, column_index[c]] = n
+        analyzed_data = pd.DataFrame(counts_out, columns=count_columns)
+        analyzed_data.insert(0, 'URL', urls)
+        st.session_state.analyzed_data = analyzed_data
         elapsed_time = time.time() - start_time
-        st.session_state.analyzed_data = pd.DataFrame(results).fillna(0) # Fill NaN with 0 for missing domains in some rows
         
         status_text.empty()
         progress_bar.empty()
         st.success(f"✅ Analysis Complete in {elapsed_time:.2f} seconds!")
+        if failed_count:
+            st.warning(f"⚠️ {failed_count} pages could not be fetched and are shown with 0 links; run the analysis again to retry them.")
 
 # Display Results
 if st.session_state.analyzed_data is not None:
     df = st.session_state.analyzed_data
     
     # Calculate Categories
-    df['Category'] = df['URL'].apply(extract_category)
+    df['Category'] = extract_categories(df['URL'])
     
     st.divider()
     st.subheader("Results")
@@ -303,16 +187,16 @@ if st.session_state.analyzed_data is not None:
     st.subheader("📂 Category Analysis")
     st.markdown("Average internal links per sub-folder.")
     
-    category_stats = df.groupby('Category').agg({
-        'URL': 'count',
-        'Total': 'mean'
-    }).reset_index()
-    
-    category_stats.columns = ['Category', 'Page Count', 'Avg. Internal Links']
-    category_stats['Avg. Internal Links'] = category_stats['Avg. Internal Links'].round(1)
+    # One unsorted grouper feeds both aggregates; rows are sorted by page count below
+    grouped = df.groupby('Category', sort=False)['Total']
+    category_stats = pd.DataFrame({
+        'Page Count': grouped.size(),
+        'Avg. Internal Links': grouped.mean().round(1),
+    }).rename_axis('Category').reset_index()
     
     # Sort by page count by default
-    category_stats = category_stats.sort_values('Page Count', ascending=False)
+    category_stats = category_stats.sort_values('Page Count', ascending=False, kind='stable')
+    progress_max = max(category_stats['Avg. Internal Links'].max(), 10)
     
     st.dataframe(
         category_stats,
@@ -320,7 +204,7 @@ if st.session_state.analyzed_data is not None:
         column_config={
             "Category": st.column_config.TextColumn("Sub-Folder", help="The root folder of the URL path"),
             "Page Count": st.column_config.NumberColumn("Pages"),
-            "Avg. Internal Links": st.column_config.ProgressColumn("Avg. Cross-Links", format="%.1f", min_value=0, max_value=max(category_stats['Avg. Internal Links'].max(), 10))
+            "Avg. Internal Links": st.column_config.ProgressColumn("Avg. Cross-Links", format="%.1f", min_value=0, max_value=progress_max)
         },
         hide_index=True
     )
@@ -352,7 +236,10 @@ if st.session_state.analyzed_data is not None:
         column_config=column_config
     )
     
-    csv = df.to_csv(index=False).encode('utf-8')
+    # pyarrow writes UTF-8 bytes directly, skipping the intermediate Python string
+    buffer = io.BytesIO()
+    pacsv.write_csv(pa.Table.from_pandas(df, preserve_index=False), buffer)
+    csv = buffer.getvalue()
     st.download_button(
         label="📥 Download Analyzed CSV",
         data=csv,
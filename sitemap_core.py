@@ -0,0 +1,525 @@
+"""
+Sitemap discovery, extraction and internal-link counting shared by the Streamlit app.
+"""
+import streamlit as st
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+import time
+import concurrent.futures
+import contextlib
+import functools
+import json
+import re
+import socket
+import sqlite3
+import threading
+import zlib
+import lxml.html
+from lxml import etree
+
+# --- Helper Functions ---
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Encoding': 'gzip, deflate, br',
+}
+# Size of the shared connection pool; also the ceiling for concurrent page fetches
+POOL_SIZE = 32
+# Number of child sitemaps fetched at once when walking a sitemap index
+SITEMAP_WORKERS = 16
+# "Sitemap: <url>" directive in robots.txt, matched on raw bytes
+ROBOTS_SITEMAP_RE = re.compile(rb'^\s*sitemap\s*:\s*(\S+)', re.IGNORECASE)
+# Upper bound on the decoded bytes read from a single sitemap
+MAX_SITEMAP_BYTES = 200_000_000
+# Start of an HTML document, used to reject error pages served in place of a sitemap
+HTML_START_RE = re.compile(rb'^\s*<(?:!doctype\s+html|html)[\s>]', re.IGNORECASE)
+# Leading bytes of a gzip stream (e.g. sitemap.xml.gz)
+GZIP_MAGIC = b'\x1f\x8b'
+# Fully qualified (Clark notation) sitemap tag names, built once rather than per <loc>
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+LOC_TAG = f'{{{SITEMAP_NS}}}loc'
+SITEMAP_TAG = f'{{{SITEMAP_NS}}}sitemap'
+# Only the first MB of a page is parsed; bounds memory and bandwidth on huge pages
+MAX_PAGE_BYTES = 1_000_000
+# Seconds a resolved host address is reused before DNS is queried again
+DNS_TTL = 300
+# Most lookups kept at once; expired ones are dropped first when it fills up
+DNS_CACHE_SIZE = 1024
+# On-disk cache of each page's content hrefs, keyed by URL only, so a rerun with
+# other target domains recounts stored pages instead of fetching them again
+PAGE_CACHE_PATH = '.sitemap_cache.sqlite'
+PAGE_CACHE_EXPIRE = 86400
+
+# Page parsing: compiled XPath expressions reused for every page, one parser per thread
+_thread_local = threading.local()
+# Main content candidates in priority order: <article>, then <main>, then fallback to <body>
+CONTENT_XPATHS = [etree.XPath(f'(//{tag})[1]') for tag in ('article', 'main', 'body')]
+# Navigation, footer, sidebars etc. whose links are not counted
+EXCLUDE_TAGS = ('nav', 'header', 'footer', 'aside', 'form', 'script', 'style')
+# Plain strings, so stored hrefs don't keep their page's tree alive
+HREFS_XPATH = etree.XPath('.//a/@href', smart_strings=False)
+# http(s) scheme prefix of a user-entered site URL
+HTTP_SCHEME_RE = re.compile(r'^https?://', re.IGNORECASE)
+# Matches hrefs that carry their own scheme (absolute links, mailto:, javascript:, ...)
+SCHEME_RE = re.compile(r'^[a-zA-Z][a-zA-Z0-9+.-]*:')
+# C0 controls and space, which urlsplit also strips from both ends of a URL
+C0_CONTROL_OR_SPACE = ''.join(chr(i) for i in range(0x21))
+
+class SitemapError(LookupError):
+    """
+    Raised when no sitemap, or no links in it, could be found. Being an exception,
+    the empty result is never stored by st.cache_data and the next run retries.
+    """
+
+@st.cache_resource
+def install_dns_cache():
+    """
+    Wraps socket.getaddrinfo with a TTL cache, once per process, so new pooled
+    connections to an already resolved host skip the DNS lookup.
+    """
+    resolve = getattr(socket.getaddrinfo, '__wrapped__', socket.getaddrinfo)
+    cache = {}
+    lock = threading.Lock()
+
+    @functools.wraps(resolve)
+    def cached_getaddrinfo(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        hit = cache.get(key)
+        if hit and time.monotonic() - hit[0] < DNS_TTL:
+            return hit[1]
+        result = resolve(*args, **kwargs)
+        now = time.monotonic()
+        with lock:
+            # The wrapper serves the whole server process, so keep the cache bounded
+            if len(cache) >= DNS_CACHE_SIZE:
+                for expired in [k for k, (t, _) in cache.items() if now - t >= DNS_TTL]:
+                    del cache[expired]
+                if len(cache) >= DNS_CACHE_SIZE:
+                    cache.clear()
+            cache[key] = (now, result)
+        return result
+
+    socket.getaddrinfo = cached_getaddrinfo
+
+@st.cache_resource
+def get_session():
+    """
+    Returns a shared requests.Session so every fetch reuses pooled keep-alive connections.
+    """
+    install_dns_cache()
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(
+        pool_connections=POOL_SIZE,
+        pool_maxsize=POOL_SIZE,
+        max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+@functools.lru_cache(maxsize=4096)
+def normalize_domain(domain):
+    """
+    Normalizes a domain by removing 'www.' and converting to lowercase.
+    """
+    if not domain:
+        return ""
+    return domain.lower().replace('www.', '')
+
+def ensure_scheme(url):
+    """
+    Prefixes a user-entered URL with https:// unless it already has an http(s) scheme.
+    Example: example.com -> https://example.com
+    """
+    url = url.strip()
+    return url if HTTP_SCHEME_RE.match(url) else 'https://' + url
+
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def get_sitemap_urls(base_url):
+    """
+    Finds the site's sitemap URLs: every Sitemap: entry in robots.txt, or else the
+    first of the common sitemap paths that exists.
+    Returns: A list of sitemap URLs.
+    Raises: SitemapError if none was found.
+    """
+    parsed_url = urlsplit(base_url)
+    domain = f"{parsed_url.scheme}://{parsed_url.netloc}"
+    
+    # Check robots.txt
+    robots_url = domain + '/robots.txt'
+    session = get_session()
+    sitemap_urls = []
+    try:
+        # Stream line by line instead of decoding and splitting the whole file
+        with session.get(robots_url, timeout=10, stream=True) as response:
+            if response.status_code == 200:
+                for line in response.iter_lines():
+                    match = ROBOTS_SITEMAP_RE.match(line)
+                    if match:
+                        sitemap_urls.append(match.group(1).decode('utf-8', errors='replace'))
+    except requests.RequestException:
+        pass
+    if sitemap_urls:
+        return list(dict.fromkeys(sitemap_urls))
+    
+    # Fallback to standard sitemap locations, probed concurrently
+    common_paths = ['/sitemap.xml', '/sitemap_index.xml', '/wp-sitemap.xml']
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(common_paths))
+    # Use HEAD request to check availability without downloading full content
+    futures = [
+        executor.submit(session.head, domain + path, timeout=10, allow_redirects=True)
+        for path in common_paths
+    ]
+    try:
+        # Check in priority order; the wait is bounded by the slowest probe, not their sum
+        for future in futures:
+            try:
+                response = future.result()
+            except requests.RequestException:
+                continue
+            if response.status_code == 200:
+                return [response.url]
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+            
+    raise SitemapError(f"No sitemap found for {domain}")
+
+def _drain_locs(parser, locs):
+    """
+    Appends the <loc> URLs the pull parser has produced so far to locs, freeing each
+    entry once read so only the current one stays in memory.
+    Returns: True if any of them belong to a sitemap index.
+    """
+    is_index = False
+    for _, loc in parser.read_events():
+        entry = loc.getparent()
+        if entry is None:
+            continue
+        if entry.tag == SITEMAP_TAG:
+            is_index = True
+        # Pretty-printed sitemaps often wrap the URL in whitespace
+        url = loc.text.strip() if loc.text else ''
+        if url:
+            locs.append(url)
+            
+        loc.clear()
+        while entry.getprevious() is not None:
+            del entry.getparent()[0]
+    return is_index
+
+def _fetch_sitemap(sitemap_url, session):
+    """
+    Fetches and stream-parses a single sitemap XML.
+    Returns: ('index', child sitemap URLs) for a sitemap index, otherwise ('urls', page URLs).
+    """
+    kind, locs = 'urls', []
+    try:
+        with session.get(sitemap_url, timeout=15, stream=True) as response:
+            if response.status_code != 200:
+                return 'urls', []
+
+            # Refuse bodies the server already reports as too large
+            content_length = response.headers.get('Content-Length', '')
+            if content_length.isdigit() and int(content_length) > MAX_SITEMAP_BYTES:
+                return 'urls', []
+
+            # Feed the body to the parser as it arrives instead of building the whole tree
+            # recover salvages sitemaps with stray bad characters instead of discarding them;
+            # entities are never resolved, so a hostile sitemap cannot pull in external files
+            parser = etree.XMLPullParser(
+                events=('end',),
+                tag=LOC_TAG,
+                recover=True,
+                huge_tree=True,
+                remove_blank_text=True,
+                resolve_entities=False,
+            )
+            decompressor = None
+            read = 0
+            for i, chunk in enumerate(response.iter_content(chunk_size=64 * 1024)):
+                if i == 0:
+                    # An HTML page (e.g. a soft 404 served at /sitemap.xml) is rejected unparsed
+                    if HTML_START_RE.match(chunk):
+                        return 'urls', []
+                    # A .xml.gz sitemap is itself a gzip file; inflate it as it streams
+                    if chunk.startswith(GZIP_MAGIC):
+                        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+                if decompressor:
+                    chunk = decompressor.decompress(chunk)
+                read += len(chunk)
+                if read > MAX_SITEMAP_BYTES:
+                    # Keep what was parsed so far but stop reading an oversized sitemap
+                    break
+                parser.feed(chunk)
+                if _drain_locs(parser, locs):
+                    kind = 'index'
+            else:
+                # Closing flushes the events for the end of a fully read body
+                parser.close()
+                if _drain_locs(parser, locs):
+                    kind = 'index'
+                     
+    except (requests.RequestException, etree.XMLSyntaxError, zlib.error):
+        return 'urls', []
+        
+    return kind, locs
+
+def iter_sitemap_links(sitemap_urls):
+    """
+    Yields page URLs from the given sitemaps, following sitemap indexes.
+    All sitemaps are fetched concurrently: whichever index finishes first has its
+    children submitted right away, while URLs are still yielded in sitemap order,
+    each index's children taking its place.
+    """
+    session = get_session()
+    # Sitemaps already scheduled; indexes that list a sitemap twice or refer back to
+    # each other would otherwise refetch it, or loop forever
+    visited = set()
+    # Submitted sitemaps not yet handled, and the child futures of handled indexes
+    in_flight = set()
+    children = {}
+    
+    with concurrent.futures.ThreadPoolExecutor(max_workers=SITEMAP_WORKERS) as executor:
+        def schedule(urls):
+            futures = []
+            for url in urls:
+                if url not in visited:
+                    visited.add(url)
+                    future = executor.submit(_fetch_sitemap, url, session)
+                    in_flight.add(future)
+                    futures.append(future)
+            return futures
+            
+        # Output order: one iterator of futures per level of the index tree being walked
+        stack = [iter(schedule(sitemap_urls))]
+        while stack:
+            future = next(stack[-1], None)
+            if future is None:
+                stack.pop()
+                continue
+            # Handle sitemaps in completion order until this one is done,
+            # so every finished index submits its children without waiting its turn
+            while future in in_flight:
+                done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for finished in done:
+                    in_flight.discard(finished)
+                    kind, items = finished.result()
+                    if kind == 'index':
+                        children[finished] = schedule(items)
+            kind, items = future.result()
+            if kind == 'index':
+                stack.append(iter(children.pop(future)))
+            else:
+                yield from items
+
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def extract_links_from_sitemap(sitemap_urls):
+    """
+    Extracts the unique page URLs from the given sitemaps, in sitemap order.
+    Duplicates (pages listed in several sitemaps, fragment/query variants) are dropped
+    as the URLs stream in; the first URL listed for a page is kept exactly as written.
+    Raises: SitemapError if the sitemaps yielded no links.
+    """
+    seen = set()
+    links = []
+    for url in iter_sitemap_links(sitemap_urls):
+        key = canonicalize_url(url)
+        if key not in seen:
+            seen.add(key)
+            links.append(url)
+    if not links:
+        raise SitemapError("No links found in " + ", ".join(sitemap_urls))
+    return links
+
+def _read_capped(response, limit):
+    """
+    Reads at most `limit` decoded bytes from a streamed response body.
+    """
+    chunks, size = [], 0
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= limit:
+            break
+    return b''.join(chunks)[:limit]
+
+def _empty_counts(target_domains):
+    """
+    Returns a zeroed result dictionary with 'Total' and individual domain counts.
+    """
+    results = {d: 0 for d in target_domains}
+    results['Total'] = 0
+    return results
+
+@functools.lru_cache(maxsize=64)
+def _domain_pattern(target_domains):
+    """
+    Compiles one anchored regex matching absolute or protocol-relative links to any of the
+    target domains, so hrefs can be classified without parsing them. Group 1 is the domain.
+    """
+    alternatives = '|'.join(re.escape(d) for d in target_domains if d)
+    return re.compile(r'^(?:https?:)?//(?:www\.)?(' + alternatives + r')(?:[/?#]|$)', re.IGNORECASE)
+
+def _html_parser():
+    """
+    Returns the calling thread's HTML parser. An lxml parser parses one document
+    at a time, so a single shared instance would serialize the worker threads.
+    """
+    parser = getattr(_thread_local, 'html_parser', None)
+    if parser is None:
+        parser = _thread_local.html_parser = lxml.html.HTMLParser(remove_comments=True)
+    return parser
+
+def _extract_hrefs(html):
+    """
+    Parses a page's HTML and returns the hrefs in its main content,
+    heuristically excluding navigation, footer, and sidebars.
+    Depends only on its argument, so it is safe to run on any worker.
+    """
+    try:
+        tree = lxml.html.fromstring(html, parser=_html_parser())
+    except etree.ParserError:
+        # An empty or whitespace-only page has no links
+        return []
+    
+    # Heuristic: Find main content to avoid counting nav/footer links
+    content_area = None
+    for content_xpath in CONTENT_XPATHS:
+        matches = content_xpath(tree)
+        if matches:
+            content_area = matches[0]
+            break
+        
+    if content_area is None:
+         return []
+
+    # Drop the unwanted subtrees within the content_area before collecting links
+    for tag in list(content_area.iter(*EXCLUDE_TAGS)):
+        tag.drop_tree()
+        
+    return HREFS_XPATH(content_area)
+
+def count_page_links(hrefs, page_url, target_domains):
+    """
+    Counts a page's unique internal links to any of the target domains.
+    hrefs: The page's content hrefs, as returned by fetch_page_hrefs.
+    target_domains: A frozenset of normalized domain strings.
+    Returns: A dictionary with 'Total' and individual domain counts.
+    """
+    results = _empty_counts(target_domains)
+    
+    pattern = _domain_pattern(target_domains)
+    parsed_page = urlsplit(page_url)
+    page_domain = normalize_domain(parsed_page.netloc)
+    page_is_target = page_domain in target_domains
+    page_origin = f"{parsed_page.scheme}://{parsed_page.netloc}"
+    page_key = page_url.split('#', 1)[0]
+    
+    # Track unique linked pages to avoid double counting same link
+    found_links = set()
+    
+    for href in hrefs:
+        # Padded hrefs (e.g. " https://...") must not fall into the relative branch
+        href = href.strip(C0_CONTROL_OR_SPACE)
+        if not href or href[0] == '#':
+            # Empty or same-page anchor: never a link to another page
+            continue
+        if href.startswith('//') or SCHEME_RE.match(href):
+            # Absolute link: match the target domains directly against the raw href
+            match = pattern.match(href)
+            if not match:
+                continue
+            link_domain = match.group(1).lower()
+            full_url = f"{parsed_page.scheme}:{href}" if href.startswith('//') else href
+        else:
+            # Relative link: it belongs to page_url's domain
+            if not page_is_target:
+                continue
+            link_domain = page_domain
+            # Root-relative paths only need the page origin; anything else goes through urljoin
+            full_url = page_origin + href if href[0] == '/' else urljoin(page_url, href)
+        
+        # Count each linked page once, ignoring fragments and anchor links to the same page
+        link_key = full_url.split('#', 1)[0]
+        if link_key != page_key and link_key not in found_links:
+            found_links.add(link_key)
+            results[link_domain] += 1
+            results['Total'] += 1
+            
+    return results
+
+def fetch_page_hrefs(page_url, session):
+    """
+    Fetches a page and extracts the hrefs in its main content.
+    session: The shared requests.Session, passed in so worker threads share its pool.
+    Returns: A list of hrefs, or None if the page could not be fetched.
+    """
+    try:
+        with session.get(page_url, timeout=10, stream=True) as response:
+            if response.status_code == 200:
+                html = _read_capped(response, MAX_PAGE_BYTES)
+                return _extract_hrefs(html)
+    except Exception:
+        pass
+    return None
+
+def _open_page_cache():
+    """
+    Opens the on-disk page cache, creating its table on first use.
+    """
+    conn = sqlite3.connect(PAGE_CACHE_PATH, timeout=30)
+    conn.execute('CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, fetched REAL NOT NULL, hrefs TEXT NOT NULL)')
+    return conn
+
+def load_page_hrefs(urls):
+    """
+    Reads the given pages' hrefs from the on-disk page cache.
+    Returns: A dict of URL -> hrefs for every page fetched within PAGE_CACHE_EXPIRE.
+    """
+    cutoff = time.time() - PAGE_CACHE_EXPIRE
+    found = {}
+    with contextlib.closing(_open_page_cache()) as conn:
+        # Batched to stay under SQLite's limit on bound parameters
+        for start in range(0, len(urls), 500):
+            batch = urls[start:start + 500]
+            rows = conn.execute(
+                f"SELECT url, hrefs FROM pages WHERE fetched > ? AND url IN ({','.join('?' * len(batch))})",
+                [cutoff, *batch],
+            )
+            found.update((url, json.loads(hrefs)) for url, hrefs in rows)
+    return found
+
+def store_page_hrefs(pages):
+    """
+    Saves fetched pages' hrefs to the on-disk page cache and drops expired entries,
+    so it only ever holds the pages fetched within PAGE_CACHE_EXPIRE.
+    pages: A dict of URL -> hrefs.
+    """
+    now = time.time()
+    with contextlib.closing(_open_page_cache()) as conn, conn:
+        conn.executemany(
+            'INSERT OR REPLACE INTO pages VALUES (?, ?, ?)',
+            [(url, now, json.dumps(hrefs)) for url, hrefs in pages.items()],
+        )
+        conn.execute('DELETE FROM pages WHERE fetched <= ?', (now - PAGE_CACHE_EXPIRE,))
+
+def canonicalize_url(url):
+    """
+    Canonicalizes a URL into a de-duplication key: lowercases scheme and host, sorts the
+    query parameters and drops the fragment.
+    Example: HTTPS://Example.com/a?b=2&a=1#top -> https://example.com/a?a=1&b=2
+    """
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', query, ''))
+
+def extract_categories(urls):
+    """
+    Extracts the first directory from each URL path to use as a category,
+    in a single vectorized regex pass over a Series of URLs.
+    Example: https://example.com/blog/post-1 -> 'blog'
+    """
+    return urls.str.extract(r'^[^:/?#]+://[^/?#]*/+([^/?#]+)', expand=False).fillna('root')